@@ -3,35 +3,226 @@ Content Generator using LLM API to create interconnected notes
 Supports OpenAI API and can be extended for other providers
 """
 import os
+import io
 import json
+import time
 import random
+import sqlite3
+import asyncio
+from functools import lru_cache
 from typing import Dict, List, Optional
 
+import numpy as np
+
+from response_cache import ResponseCache
+
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI, RateLimitError, DefaultAioHttpClient, DefaultAsyncHttpxClient
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
 
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Keywords that mark a topic as a particular note type
+_PERSON_KW = frozenset({"person", "author", "scientist"})
+_EVENT_KW = frozenset({"event", "meeting", "conference"})
+_PROJECT_KW = frozenset({"project", "case study"})
+
+
+@lru_cache(maxsize=None)
+def _note_type_for(topic: str) -> str:
+    """Determine the type of note based on topic, cached per topic"""
+    topic_lower = topic.lower()
+    if any(word in topic_lower for word in _PERSON_KW):
+        return "person"
+    elif any(word in topic_lower for word in _EVENT_KW):
+        return "event"
+    elif any(word in topic_lower for word in _PROJECT_KW):
+        return "project"
+    else:
+        return "concept"
+
+
+@lru_cache(maxsize=None)
+def _encoding_for(model: str):
+    """
+    Return the tiktoken encoding for a model, defaulting to o200k_base
+    
+    Returns None if the encoding cannot be loaded (e.g. its first-use
+    download fails); the result is cached so the load is not retried per call.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+class _TokenBucket:
+    """Async token bucket refilled continuously at a per-minute rate"""
+    
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self, amount: float = 1):
+        """Wait until `amount` tokens are available, then take them"""
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
 
 class ContentGenerator:
-    """Generate interconnected content for Obsidian vaults using LLM API"""
+    """
+    Generate interconnected content for Obsidian vaults using LLM API
     
-    def __init__(self, api_key: Optional[str] = None, provider: str = "openai"):
+    Instances are meant to be long-lived: the API clients and their pooled
+    keep-alive connections are shared by every request. Async generation can
+    be wrapped in `async with generator:` to release the async connections
+    when the event loop is done with them.
+    """
+    
+    # Static instructions live in the system message so every request shares
+    # a byte-identical prefix (eligible for server-side prompt caching); only
+    # the per-note slot values go in the user message.
+    NOTE_SYSTEM_PROMPT = """You are a knowledge management expert creating interconnected notes for an Obsidian vault.
+
+The user gives you a topic, a note type and a list of related topics.
+Create a comprehensive Obsidian note about the topic.
+
+Include:
+1. A clear introduction explaining the topic
+2. Key concepts and definitions
+3. Important details and context
+4. Examples or applications if relevant
+5. A "Related Topics" section with links to every related topic
+
+Format as clean markdown. Use [[double brackets]] for internal links.
+Keep it informative and well-structured."""
+    
+    ALL_NOTES_SYSTEM_PROMPT = """You are a knowledge management expert creating interconnected notes for an Obsidian vault.
+
+The user gives you several notes to write, each with a topic, a note type and a list of related topics.
+Create a comprehensive Obsidian note about each topic.
+
+Each note should include:
+1. A clear introduction explaining the topic
+2. Key concepts and definitions
+3. Important details and context
+4. Examples or applications if relevant
+5. A "Related Topics" section with links to every related topic
+
+Format each note as clean markdown. Use [[double brackets]] for internal links.
+Keep them informative and well-structured.
+Return a JSON object mapping each topic to its note."""
+    
+    TOPICS_SYSTEM_PROMPT = """You are a knowledge base architect.
+
+The user gives you a main topic and a number of topics.
+Generate that many interconnected topics related to the main topic for a knowledge base.
+
+Topics should be:
+- Diverse and interesting
+- Naturally interconnected
+- Suitable for a knowledge graph
+- Clear and specific"""
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        provider: str = "openai",
+        model: str = "gpt-4o-mini",
+        cache_dir: Optional[str] = "~/.cache/vault_gen",
+        semantic_cache: bool = False,
+        similarity_threshold: float = 0.9,
+        embedding_model: str = "text-embedding-3-small",
+        rewrite_model: str = "gpt-4o-mini"
+    ):
         """
         Initialize the content generator
         
         Args:
             api_key: API key for the LLM provider (defaults to OPENAI_API_KEY env var)
             provider: LLM provider ("openai", "anthropic", etc.)
+            model: Chat model used to generate topics and notes
+            cache_dir: Directory for the persistent response cache (None disables caching)
+            semantic_cache: Adapt cached notes on similar topics with a cheaper
+                model instead of generating every note from scratch
+            similarity_threshold: Minimum cosine similarity between topic
+                embeddings for a cached note to be reused
+            embedding_model: Model used to embed topics for the semantic cache
+            rewrite_model: Model used to adapt a similar cached note. It should
+                be cheaper than model; if it is the same model the semantic
+                cache is skipped, since an embedding call plus a rewrite would
+                cost more than generating the note
         """
         self.provider = provider
+        self.model = model
         self.api_key = api_key or os.getenv("OPENAI_API_KEY", "")
+        self.cache = None
+        if cache_dir:
+            try:
+                self.cache = ResponseCache(cache_dir)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Response cache disabled: could not open {cache_dir}: {e}")
+        self.semantic_cache = semantic_cache
+        self.similarity_threshold = similarity_threshold
+        self.embedding_model = embedding_model
+        self.rewrite_model = rewrite_model
+        
+        if semantic_cache and rewrite_model == model:
+            print(f"Semantic cache disabled: rewrite model {rewrite_model} is the same as the "
+                  f"note model, so adapting a cached note would cost more than a new one")
         
         if provider == "openai" and self.api_key and OPENAI_AVAILABLE:
             self.openai_client = OpenAI(api_key=self.api_key)
+            self.async_client = self._new_async_client()
         else:
             self.openai_client = None
+            self.async_client = None
+    
+    def _new_async_client(self) -> "AsyncOpenAI":
+        """Create the async client with its own keep-alive connection pool"""
+        try:
+            # aiohttp transport, available with the openai[aiohttp] extra
+            http_client = DefaultAioHttpClient()
+        except RuntimeError:
+            http_client = DefaultAsyncHttpxClient()
+        return AsyncOpenAI(api_key=self.api_key, http_client=http_client)
+    
+    async def __aenter__(self) -> "ContentGenerator":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    async def aclose(self):
+        """
+        Close the async client's connections
+        
+        A fresh client is created afterwards so the generator can be reused
+        from another event loop (e.g. a later asyncio.run call).
+        """
+        if self.async_client:
+            await self.async_client.close()
+            self.async_client = self._new_async_client()
     
     def generate_note_content(
         self,
@@ -50,11 +241,6 @@ class ContentGenerator:
         Returns:
             Markdown content for the note
         """
-        # Create links section
-        links_section = "\n\n## Related Topics\n"
-        for related in related_topics:
-            links_section += f"- [[{related}]]\n"
-        
         # If API key is available, use LLM to generate content
         if self.api_key and self.provider == "openai" and self.openai_client:
             return self._generate_with_openai(topic, related_topics, note_type)
@@ -62,6 +248,365 @@ class ContentGenerator:
             # Fallback to template-based generation
             return self._generate_template(topic, related_topics, note_type)
     
+    async def agenerate_note_content(
+        self,
+        topic: str,
+        related_topics: List[str],
+        note_type: str = "concept"
+    ) -> str:
+        """
+        Async version of generate_note_content
+        
+        Allows many notes to be requested concurrently (e.g. with asyncio.gather)
+        instead of waiting for each API round trip in turn.
+        """
+        if self.api_key and self.provider == "openai" and self.async_client:
+            return await self._agenerate_with_openai(topic, related_topics, note_type)
+        else:
+            return self._generate_template(topic, related_topics, note_type)
+    
+    async def generate_all_notes(
+        self,
+        structure: Dict[str, Dict],
+        rpm: int = 500,
+        tpm: int = 150_000,
+        chunk_size: int = 10,
+        max_output_tokens: int = 16_000
+    ) -> Dict[str, str]:
+        """
+        Generate every note of a vault with as few requests as possible
+        
+        The whole vault is requested in one structured-output call returning a
+        JSON object of topic -> markdown. If the notes cannot fit in one
+        response, or the call fails, topics are split into chunks that are
+        requested concurrently; chunks that still fail are generated note by
+        note as in generate_notes_parallel. All requests share the same
+        request and token buckets, so the account rate limits are respected.
+        
+        Args:
+            structure: Vault structure from generate_vault_structure
+            rpm: Requests per minute allowed for the account
+            tpm: Tokens per minute allowed for the account
+            chunk_size: Number of notes per request when splitting
+            max_output_tokens: Completion token limit of the model
+            
+        Returns:
+            Dictionary mapping topics to their markdown content
+        """
+        jobs = [
+            {"topic": topic, "related_topics": meta["related"], "note_type": meta["note_type"]}
+            for topic, meta in structure.items()
+        ]
+        if not (self.api_key and self.provider == "openai" and self.async_client):
+            return {job["topic"]: self._generate_template(**job) for job in jobs}
+        
+        request_bucket = _TokenBucket(rpm)
+        token_bucket = _TokenBucket(tpm)
+        
+        # Budget the same 1000 tokens per note as single-note requests
+        if len(jobs) * 1000 <= max_output_tokens:
+            try:
+                return await self._agenerate_notes_combined(
+                    jobs, len(jobs) * 1000, request_bucket, token_bucket
+                )
+            except Exception as e:
+                print(f"Error generating all notes in one request: {e}")
+        
+        chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+        max_tokens = min(max_output_tokens, chunk_size * 1000)
+        results = await asyncio.gather(
+            *(
+                self._agenerate_notes_combined(chunk, max_tokens, request_bucket, token_bucket)
+                for chunk in chunks
+            ),
+            return_exceptions=True
+        )
+        
+        contents = {}
+        failed_jobs = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                print(f"Error generating notes in one request: {result}")
+                failed_jobs.extend(chunk)
+            else:
+                contents.update(result)
+        
+        # Generate the notes of every failed chunk together so they run concurrently
+        if failed_jobs:
+            contents.update(zip(
+                (job["topic"] for job in failed_jobs),
+                await self._agenerate_notes_throttled(failed_jobs, request_bucket, token_bucket)
+            ))
+        return {job["topic"]: contents[job["topic"]] for job in jobs}
+    
+    async def _agenerate_notes_combined(
+        self,
+        jobs: List[Dict],
+        max_tokens: int,
+        request_bucket: _TokenBucket,
+        token_bucket: _TokenBucket
+    ) -> Dict[str, str]:
+        """
+        Request several notes in a single structured-output call
+        
+        Raises if the response is not a JSON object with a note for every topic
+        (e.g. because it was cut off at max_tokens).
+        """
+        topics = [job["topic"] for job in jobs]
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "vault_notes",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {topic: {"type": "string"} for topic in topics},
+                    "required": topics,
+                    "additionalProperties": False
+                }
+            }
+        }
+        prompt = "\n\n".join(self._build_note_messages(**job)[1]["content"] for job in jobs)
+        messages = [
+            {"role": "system", "content": self.ALL_NOTES_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        
+        content = self._cached_response(messages, 0.7, max_tokens)
+        if content is None:
+            await request_bucket.acquire(1)
+            await token_bucket.acquire(self._estimate_tokens(messages) + max_tokens)
+            content = await self._achat(
+                messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                response_format=response_format
+            )
+        
+        notes = json.loads(content)
+        return {
+            job["topic"]: self._ensure_links_section(notes[job["topic"]], job["related_topics"])
+            for job in jobs
+        }
+    
+    async def generate_notes_parallel(
+        self,
+        jobs: List[Dict],
+        rpm: int = 500,
+        tpm: int = 150_000,
+        max_concurrent: int = 50,
+        max_retries: int = 5
+    ) -> List[str]:
+        """
+        Generate many notes concurrently while staying under the API rate limits
+        
+        Requests are throttled up front with token buckets for requests and
+        tokens per minute, so they rarely hit 429s. Requests that are still
+        rate limited are retried with exponential backoff and jitter.
+        
+        Args:
+            jobs: List of dicts with "topic", "related_topics" and "note_type" keys
+            rpm: Requests per minute allowed for the account
+            tpm: Tokens per minute allowed for the account
+            max_concurrent: Maximum number of requests in flight
+            max_retries: Retries per note after a rate limit error
+            
+        Returns:
+            Markdown content for each job, in the same order as jobs
+        """
+        if not (self.api_key and self.provider == "openai" and self.async_client):
+            return [self._generate_template(**job) for job in jobs]
+        
+        return await self._agenerate_notes_throttled(
+            jobs,
+            _TokenBucket(rpm),
+            _TokenBucket(tpm),
+            max_concurrent=max_concurrent,
+            max_retries=max_retries
+        )
+    
+    async def _agenerate_notes_throttled(
+        self,
+        jobs: List[Dict],
+        request_bucket: _TokenBucket,
+        token_bucket: _TokenBucket,
+        max_concurrent: int = 50,
+        max_retries: int = 5
+    ) -> List[str]:
+        """Generate notes one request each, throttled by the given buckets"""
+        semaphore = asyncio.Semaphore(max_concurrent)
+        
+        async def worker(job: Dict) -> str:
+            messages = self._build_note_messages(**job)
+            cached = self._cached_response(messages, 0.7, 1000)
+            if cached is not None:
+                return self._ensure_links_section(cached, job["related_topics"])
+            
+            # Completion tokens count against TPM too, so reserve max_tokens
+            tokens = self._estimate_tokens(messages) + 1000
+            async with semaphore:
+                for attempt in range(max_retries + 1):
+                    await request_bucket.acquire(1)
+                    await token_bucket.acquire(tokens)
+                    try:
+                        content = await self._arequest_note(messages, **job)
+                        return self._ensure_links_section(content, job["related_topics"])
+                    except RateLimitError:
+                        if attempt == max_retries:
+                            print(f"Rate limited generating {job['topic']}, giving up")
+                            break
+                        await asyncio.sleep(min(60, 2 ** attempt) * (1 + random.random()))
+                    except Exception as e:
+                        print(f"Error generating with OpenAI: {e}")
+                        break
+            return self._generate_template(**job)
+        
+        return await asyncio.gather(*(worker(job) for job in jobs))
+    
+    def _estimate_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """
+        Estimate the prompt tokens of a chat request
+        
+        Counts with the model's tiktoken encoding when available; falls back
+        to ~4 characters per token if tiktoken is missing or cannot load the
+        encoding, so estimation never fails a request.
+        """
+        text = "".join(message["content"] for message in messages)
+        # ~4 tokens of overhead per message
+        overhead = 4 * len(messages)
+        encoding = _encoding_for(self.model) if TIKTOKEN_AVAILABLE else None
+        if encoding is not None:
+            return len(encoding.encode(text)) + overhead
+        return len(text) // 4 + overhead
+    
+    def generate_notes_batch(
+        self,
+        jobs: List[Dict],
+        poll_interval: float = 30.0
+    ) -> List[str]:
+        """
+        Generate many notes through the OpenAI Batch API
+        
+        All prompts are uploaded as a single JSONL file and processed within the
+        24h batch window, at half the cost of regular requests and outside the
+        per-request rate limits. This call blocks until the batch finishes.
+        
+        Args:
+            jobs: List of dicts with "topic", "related_topics" and "note_type" keys
+            poll_interval: Seconds to wait between batch status checks
+            
+        Returns:
+            Markdown content for each job, in the same order as jobs
+        """
+        if not (self.api_key and self.provider == "openai" and self.openai_client):
+            return [self._generate_template(**job) for job in jobs]
+        
+        results = {}
+        pending = {}
+        for i, job in enumerate(jobs):
+            messages = self._build_note_messages(**job)
+            cached = self._cached_response(messages, 0.7, 1000)
+            if cached is None:
+                pending[f"note-{i}"] = messages
+            else:
+                results[f"note-{i}"] = cached
+        
+        if pending:
+            try:
+                for custom_id, content in self._run_batch(pending, poll_interval).items():
+                    results[custom_id] = content
+                    self._store_response(pending[custom_id], 0.7, 1000, content)
+            except Exception as e:
+                print(f"Error generating batch with OpenAI: {e}")
+        
+        contents = []
+        for i, job in enumerate(jobs):
+            content = results.get(f"note-{i}")
+            if content is None:
+                contents.append(self._generate_template(**job))
+            else:
+                contents.append(self._ensure_links_section(content, job["related_topics"]))
+        return contents
+    
+    def _run_batch(self, requests: Dict[str, List[Dict[str, str]]], poll_interval: float) -> Dict[str, str]:
+        """
+        Submit chat requests as one batch and wait for the results
+        
+        Args:
+            requests: Mapping of custom_id to chat messages
+            poll_interval: Seconds to wait between batch status checks
+            
+        Returns:
+            Mapping of custom_id to response content for successful requests
+        """
+        lines = []
+        for custom_id, messages in requests.items():
+            lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": messages,
+                    "temperature": 0.7,
+                    "max_tokens": 1000
+                }
+            }))
+        batch_input = io.BytesIO("\n".join(lines).encode("utf-8"))
+        
+        input_file = self.openai_client.files.create(
+            file=("vault_notes.jsonl", batch_input),
+            purpose="batch"
+        )
+        batch = self.openai_client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        
+        print(f"  Submitted batch {batch.id} with {len(lines)} notes, waiting for completion...")
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(poll_interval)
+            batch = self.openai_client.batches.retrieve(batch.id)
+        
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"batch {batch.id} ended with status {batch.status}")
+        
+        output = self.openai_client.files.content(batch.output_file_id).text
+        results = {}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") == 200:
+                results[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return results
+    
+    def _build_note_messages(
+        self,
+        topic: str,
+        related_topics: List[str],
+        note_type: str
+    ) -> List[Dict[str, str]]:
+        """Build the chat messages used to generate a note"""
+        related_str = ", ".join(related_topics)
+        prompt = f"""Topic: {topic}
+Note type: {note_type}
+Related topics: {related_str}"""
+
+        return [
+            {"role": "system", "content": self.NOTE_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _ensure_links_section(self, content: str, related_topics: List[str]) -> str:
+        """Append a Related Topics section if the model left it out"""
+        if "## Related Topics" not in content:
+            links = "".join(f"- [[{related}]]\n" for related in related_topics)
+            content = f"{content}\n\n## Related Topics\n{links}"
+        return content
+    
     def _generate_with_openai(
         self,
         topic: str,
@@ -73,46 +618,223 @@ class ContentGenerator:
             return self._generate_template(topic, related_topics, note_type)
         
         try:
-            related_str = ", ".join(related_topics)
-            prompt = f"""Create a comprehensive Obsidian note about "{topic}".
-
-Note type: {note_type}
-Related topics: {related_str}
-
-Include:
-1. A clear introduction explaining the topic
-2. Key concepts and definitions
-3. Important details and context
-4. Examples or applications if relevant
-5. A "Related Topics" section with links to: {related_str}
-
-Format as clean markdown. Use [[double brackets]] for internal links.
-Keep it informative and well-structured."""
-
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a knowledge management expert creating interconnected notes for an Obsidian vault."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
+            content = self._request_note(
+                self._build_note_messages(topic, related_topics, note_type),
+                topic,
+                related_topics,
+                note_type
             )
             
-            content = response.choices[0].message.content
-            
             # Ensure links section is included
-            if "## Related Topics" not in content:
-                links_section = "\n\n## Related Topics\n"
-                for related in related_topics:
-                    links_section += f"- [[{related}]]\n"
-                content += links_section
+            return self._ensure_links_section(content, related_topics)
+        except Exception as e:
+            print(f"Error generating with OpenAI: {e}")
+            return self._generate_template(topic, related_topics, note_type)
+    
+    async def _agenerate_with_openai(
+        self,
+        topic: str,
+        related_topics: List[str],
+        note_type: str
+    ) -> str:
+        """Generate content using the async OpenAI client"""
+        if not self.async_client:
+            return self._generate_template(topic, related_topics, note_type)
+        
+        try:
+            content = await self._arequest_note(
+                self._build_note_messages(topic, related_topics, note_type),
+                topic,
+                related_topics,
+                note_type
+            )
             
-            return content
+            # Ensure links section is included
+            return self._ensure_links_section(content, related_topics)
         except Exception as e:
             print(f"Error generating with OpenAI: {e}")
             return self._generate_template(topic, related_topics, note_type)
     
+    def _request_note(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        related_topics: List[str],
+        note_type: str
+    ) -> str:
+        """
+        Request a note, reusing a similar cached note when semantic caching is on
+        
+        Without semantic caching this is a plain (exact-match cached) chat call.
+        """
+        if not self._semantic_cache_enabled():
+            return self._chat(messages, 0.7, 1000)
+        
+        cached = self._cached_response(messages, 0.7, 1000)
+        if cached is not None:
+            return cached
+        
+        template_id = f"note/{note_type}"
+        embedding = self._embed(topic)
+        match = self.cache.nearest_note(template_id, embedding, self.similarity_threshold)
+        if match:
+            similar_topic, similar_content = match
+            rewrite = self._build_rewrite_messages(similar_topic, similar_content, topic, related_topics)
+            content = self._chat(rewrite, 0.3, 1000, model=self.rewrite_model)
+            self._store_response(messages, 0.7, 1000, content)
+            return content
+        
+        content = self._chat(messages, 0.7, 1000)
+        self.cache.add_note(template_id, topic, embedding, content)
+        return content
+    
+    async def _arequest_note(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        related_topics: List[str],
+        note_type: str
+    ) -> str:
+        """Async version of _request_note"""
+        if not self._semantic_cache_enabled():
+            return await self._achat(messages, 0.7, 1000)
+        
+        cached = self._cached_response(messages, 0.7, 1000)
+        if cached is not None:
+            return cached
+        
+        template_id = f"note/{note_type}"
+        embedding = await self._aembed(topic)
+        match = self.cache.nearest_note(template_id, embedding, self.similarity_threshold)
+        if match:
+            similar_topic, similar_content = match
+            rewrite = self._build_rewrite_messages(similar_topic, similar_content, topic, related_topics)
+            content = await self._achat(rewrite, 0.3, 1000, model=self.rewrite_model)
+            self._store_response(messages, 0.7, 1000, content)
+            return content
+        
+        content = await self._achat(messages, 0.7, 1000)
+        self.cache.add_note(template_id, topic, embedding, content)
+        return content
+    
+    def _semantic_cache_enabled(self) -> bool:
+        """Whether note requests should go through the semantic cache"""
+        return bool(self.semantic_cache and self.cache and self.rewrite_model != self.model)
+    
+    def _build_rewrite_messages(
+        self,
+        similar_topic: str,
+        similar_content: str,
+        topic: str,
+        related_topics: List[str]
+    ) -> List[Dict[str, str]]:
+        """Build the messages asking a cheaper model to adapt a cached note"""
+        related_str = ", ".join(related_topics)
+        prompt = f"""Below is an Obsidian note about "{similar_topic}".
+
+Rewrite it as a note about "{topic}", keeping the same structure and level of detail.
+Correct any facts that do not apply to "{topic}".
+The "Related Topics" section must link to exactly: {related_str}
+
+Format as clean markdown. Use [[double brackets]] for internal links.
+
+---
+
+{similar_content}"""
+
+        return [
+            {"role": "system", "content": "You are a knowledge management expert creating interconnected notes for an Obsidian vault."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _embed(self, text: str) -> np.ndarray:
+        """Embed text with the OpenAI embeddings API"""
+        response = self.openai_client.embeddings.create(model=self.embedding_model, input=text)
+        return np.asarray(response.data[0].embedding, dtype=np.float32)
+    
+    async def _aembed(self, text: str) -> np.ndarray:
+        """Async version of _embed"""
+        response = await self.async_client.embeddings.create(model=self.embedding_model, input=text)
+        return np.asarray(response.data[0].embedding, dtype=np.float32)
+    
+    def _chat(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        model: Optional[str] = None,
+        response_format: Optional[Dict] = None
+    ) -> str:
+        """Send a chat request, serving it from the response cache when possible"""
+        model = model or self.model
+        cached = self._cached_response(messages, temperature, max_tokens, model)
+        if cached is not None:
+            return cached
+        
+        response = self.openai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **({"response_format": response_format} if response_format else {})
+        )
+        content = response.choices[0].message.content
+        # Truncated structured output is not valid JSON, so never cache it
+        if not (response_format and response.choices[0].finish_reason == "length"):
+            self._store_response(messages, temperature, max_tokens, content, model)
+        return content
+    
+    async def _achat(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        model: Optional[str] = None,
+        response_format: Optional[Dict] = None
+    ) -> str:
+        """Async version of _chat using the async client"""
+        model = model or self.model
+        cached = self._cached_response(messages, temperature, max_tokens, model)
+        if cached is not None:
+            return cached
+        
+        response = await self.async_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **({"response_format": response_format} if response_format else {})
+        )
+        content = response.choices[0].message.content
+        # Truncated structured output is not valid JSON, so never cache it
+        if not (response_format and response.choices[0].finish_reason == "length"):
+            self._store_response(messages, temperature, max_tokens, content, model)
+        return content
+    
+    def _cached_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        model: Optional[str] = None
+    ) -> Optional[str]:
+        """Look up a previous response for the same request"""
+        if not self.cache:
+            return None
+        return self.cache.get(ResponseCache.make_key(model or self.model, messages, temperature, max_tokens))
+    
+    def _store_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        content: str,
+        model: Optional[str] = None
+    ):
+        """Save a response in the persistent cache"""
+        if self.cache:
+            self.cache.set(ResponseCache.make_key(model or self.model, messages, temperature, max_tokens), content)
+    
     def _generate_template(
         self,
         topic: str,
@@ -120,7 +842,7 @@ Keep it informative and well-structured."""
         note_type: str
     ) -> str:
         """Generate content using templates (fallback)"""
-        content = f"""# {topic}
+        parts = [f"""# {topic}
 
 ## Overview
 
@@ -138,19 +860,20 @@ Expand on the topic here with relevant information and context.
 
 ## Related Topics
 
-"""
+"""]
         for related in related_topics:
-            content += f"- [[{related}]]\n"
+            parts.append(f"- [[{related}]]\n")
         
-        content += f"\n## Tags\n#{note_type} #{topic.replace(' ', '').lower()}\n"
+        parts.append(f"\n## Tags\n#{note_type} #{topic.replace(' ', '').lower()}\n")
         
-        return content
+        return "".join(parts)
     
     def generate_vault_structure(
         self,
         main_topic: str,
         num_nodes: int = 20,
-        connection_density: float = 0.3
+        connection_density: float = 0.3,
+        seed: Optional[int] = None
     ) -> Dict[str, Dict]:
         """
         Generate a complete vault structure with interconnected nodes
@@ -159,6 +882,7 @@ Expand on the topic here with relevant information and context.
             main_topic: Central topic of the vault
             num_nodes: Number of notes to create
             connection_density: How interconnected (0.0 to 1.0)
+            seed: Random seed for reproducible connections (None for a random layout)
             
         Returns:
             Dictionary mapping note names to their metadata and connections
@@ -169,46 +893,57 @@ Expand on the topic here with relevant information and context.
         # Create connections
         structure = {}
         
-        # Initialize structure for all topics
+        # Initialize structure for all topics; connections are collected in a
+        # set per topic and turned into lists at the end
+        related_sets = {}
         for topic in topics:
             structure[topic] = {"related": [], "note_type": self._determine_note_type(topic)}
+            related_sets[topic] = set()
         
         # Calculate target connections per node
         target_connections = max(2, int(num_nodes * connection_density))
+        max_distance = max(1, int(num_nodes * connection_density * 2))
+        
+        # Sample all candidate connections at once: prefer nearby topics but add
+        # some randomness, with probability decreasing with distance
+        n = len(topics)
+        idx = np.arange(n)
+        dist = np.abs(idx[:, None] - idx[None, :])
+        prob = connection_density * (1.0 - (dist / max_distance) * 0.5)
+        prob[dist > max_distance] = 0.0
+        np.fill_diagonal(prob, 0.0)
+        rng = np.random.default_rng(seed)
+        mask = rng.random((n, n)) < prob
+        mask |= mask.T
+        
+        # Ensure minimum connections: add the closest topics not already
+        # connected to every row that has fewer than two
+        counts = mask.sum(axis=1)
+        for i in np.flatnonzero(counts < 2):
+            missing = min(2 - counts[i], n - 1 - counts[i])
+            if missing <= 0:
+                continue
+            closest = np.where(mask[i], np.inf, dist[i])
+            closest[i] = np.inf
+            # Stable sort so ties go to the lower index, as before
+            mask[i, np.argsort(closest, kind="stable")[:missing]] = True
         
         # Create connections
         for i, topic in enumerate(topics):
-            # Get potential connections (all other topics)
-            potential = [t for t in topics if t != topic]
-            
-            # Select connections: prefer nearby topics but add some randomness
-            related = []
-            for j, other_topic in enumerate(topics):
-                if i != j:
-                    distance = abs(i - j)
-                    # Higher probability for closer topics, but allow some distant ones
-                    max_distance = max(1, int(num_nodes * connection_density * 2))
-                    if distance <= max_distance:
-                        # Probability decreases with distance
-                        prob = connection_density * (1.0 - (distance / max_distance) * 0.5)
-                        if random.random() < prob:
-                            related.append(other_topic)
-            
-            # Ensure minimum connections
-            if len(related) < 2:
-                # Add closest topics if we don't have enough
-                remaining = [t for t in potential if t not in related]
-                remaining.sort(key=lambda t: abs(topics.index(t) - i))
-                related.extend(remaining[:2 - len(related)])
-            
             # Limit to target connections
-            related = related[:target_connections]
+            related = [topics[j] for j in np.flatnonzero(mask[i])[:target_connections]]
             
-            # Update structure and ensure bi-directional connections
-            structure[topic]["related"] = related
+            # Record connections in both directions
+            related_sets[topic].update(related)
             for other_topic in related:
-                if topic not in structure[other_topic]["related"]:
-                    structure[other_topic]["related"].append(topic)
+                related_sets[other_topic].add(topic)
+        
+        # Order related topics by their position in the topic list so the
+        # output is deterministic
+        idx_of = {t: i for i, t in enumerate(topics)}
+        for topic in structure:
+            related_sets[topic].discard(topic)
+            structure[topic]["related"] = sorted(related_sets[topic], key=idx_of.__getitem__)
         
         return structure
     
@@ -225,36 +960,41 @@ Expand on the topic here with relevant information and context.
             return self._generate_topics_template(main_topic, count)
         
         try:
-            prompt = f"""Generate {count} interconnected topics related to "{main_topic}" for a knowledge base.
+            prompt = f"""Main topic: {main_topic}
+Number of topics: {count}"""
 
-Return a JSON array of topic names (strings only, no other text).
-Topics should be:
-- Diverse and interesting
-- Naturally interconnected
-- Suitable for a knowledge graph
-- Clear and specific
-
-Example format: ["Topic 1", "Topic 2", "Topic 3", ...]"""
-
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a knowledge base architect. Return only valid JSON arrays."},
+            # Structured output guarantees a bare JSON object, no code fences
+            response_format = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "topic_list",
+                    "strict": True,
+                    "schema": {
+                        "type": "object",
+                        "properties": {
+                            "topics": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "minItems": count,
+                                "maxItems": count
+                            }
+                        },
+                        "required": ["topics"],
+                        "additionalProperties": False
+                    }
+                }
+            }
+            content = self._chat(
+                [
+                    {"role": "system", "content": self.TOPICS_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.8,
-                max_tokens=500
+                max_tokens=500,
+                response_format=response_format
             )
             
-            content = response.choices[0].message.content.strip()
-            # Extract JSON array
-            if content.startswith("```"):
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-            content = content.strip()
-            
-            topics = json.loads(content)
+            topics = json.loads(content)["topics"]
             return [main_topic] + [t for t in topics if t != main_topic][:count-1]
         except Exception as e:
             print(f"Error generating topics with AI: {e}")
@@ -295,13 +1035,5 @@ Example format: ["Topic 1", "Topic 2", "Topic 3", ...]"""
     
     def _determine_note_type(self, topic: str) -> str:
         """Determine the type of note based on topic"""
-        topic_lower = topic.lower()
-        if any(word in topic_lower for word in ["person", "author", "scientist"]):
-            return "person"
-        elif any(word in topic_lower for word in ["event", "meeting", "conference"]):
-            return "event"
-        elif any(word in topic_lower for word in ["project", "case study"]):
-            return "project"
-        else:
-            return "concept"
+        return _note_type_for(topic)
 
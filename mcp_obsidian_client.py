@@ -2,7 +2,9 @@
 MCP Client for interacting with Obsidian MCP Server
 Handles communication with the Obsidian vault through MCP protocol
 """
-from typing import List, Optional
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Union
 from pathlib import Path
 
 
@@ -15,14 +17,14 @@ class ObsidianMCPClient:
         """
         pass
     
-    def create_note(self, vault_path: str, note_name: str, content: str) -> bool:
+    def create_note(self, vault_path: str, note_name: str, content: Union[str, bytes]) -> bool:
         """
         Create a new note in the Obsidian vault
         
         Args:
             vault_path: Path to the Obsidian vault
             note_name: Name of the note (without .md extension)
-            content: Markdown content for the note
+            content: Markdown content for the note (str, or UTF-8 encoded bytes)
             
         Returns:
             True if successful, False otherwise
@@ -31,19 +33,54 @@ class ObsidianMCPClient:
         note_path.parent.mkdir(parents=True, exist_ok=True)
         
         try:
-            note_path.write_text(content, encoding='utf-8')
+            note_path.write_bytes(self._encode(content))
             return True
         except Exception as e:
             print(f"Error creating note {note_name}: {e}")
             return False
     
-    def create_note_with_path(self, note_path: str, content: str) -> bool:
+    def create_notes_bulk(
+        self,
+        vault_path: str,
+        items: List[Tuple[str, Union[str, bytes]]]
+    ) -> List[bool]:
+        """
+        Create many notes in the Obsidian vault using a thread pool
+        
+        Args:
+            vault_path: Path to the Obsidian vault
+            items: List of (note_name, content) pairs, content as str or UTF-8 bytes
+            
+        Returns:
+            Success flag for each item, in the same order as items
+        """
+        vault = Path(vault_path)
+        note_paths = [vault / f"{note_name}.md" for note_name, _ in items]
+        
+        # Create each directory once up front instead of once per note
+        for directory in {path.parent for path in note_paths}:
+            directory.mkdir(parents=True, exist_ok=True)
+        
+        def write(index: int) -> bool:
+            note_name, content = items[index]
+            try:
+                note_paths[index].write_bytes(self._encode(content))
+                return True
+            except Exception as e:
+                print(f"Error creating note {note_name}: {e}")
+                return False
+        
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(write, range(len(items))))
+    
+    def create_note_with_path(self, note_path: str, content: Union[str, bytes]) -> bool:
         """
         Create a note at a specific path
         
         Args:
             note_path: Full path to the note file
-            content: Markdown content for the note
+            content: Markdown content for the note (str, or UTF-8 encoded bytes)
             
         Returns:
             True if successful, False otherwise
@@ -52,12 +89,23 @@ class ObsidianMCPClient:
         path.parent.mkdir(parents=True, exist_ok=True)
         
         try:
-            path.write_text(content, encoding='utf-8')
+            path.write_bytes(self._encode(content))
             return True
         except Exception as e:
             print(f"Error creating note at {note_path}: {e}")
             return False
     
+    def _encode(self, content: Union[str, bytes]) -> bytes:
+        """
+        Encode note content as UTF-8
+        
+        Notes are written as bytes so no newline translation happens and
+        already-encoded content is not encoded again.
+        """
+        if isinstance(content, bytes):
+            return content
+        return content.encode("utf-8")
+    
     def read_note(self, vault_path: str, note_name: str) -> Optional[str]:
         """
         Read a note from the vault
@@ -85,16 +133,38 @@ class ObsidianMCPClient:
         Returns:
             List of note names
         """
-        vault = Path(vault_path)
         notes = []
         
-        for md_file in vault.rglob("*.md"):
-            if ".obsidian" not in str(md_file):
-                relative = md_file.relative_to(vault)
-                notes.append(str(relative.with_suffix("")))
+        if not os.path.isdir(vault_path):
+            return notes
+        
+        for md_file in self._walk_markdown(vault_path):
+            relative = os.path.relpath(md_file, vault_path)
+            notes.append(relative[:-len(".md")])
         
         return notes
     
+    def _walk_markdown(self, directory: str):
+        """
+        Yield paths of markdown files under a directory
+        
+        The .obsidian config directory is skipped without being descended into,
+        and directories that cannot be read are skipped.
+        """
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            return
+        
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name == ".obsidian":
+                        continue
+                    yield from self._walk_markdown(entry.path)
+                elif entry.name.endswith(".md"):
+                    yield entry.path
+    
     def update_note(self, vault_path: str, note_name: str, content: str) -> bool:
         """
         Update an existing note
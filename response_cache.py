@@ -0,0 +1,160 @@
+"""
+Persistent cache for LLM responses
+Stores generated markdown on disk so repeated vault generations skip the API
+"""
+import os
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class ResponseCache:
+    """Disk-backed key-value cache of LLM responses using SQLite"""
+
+    def __init__(self, cache_dir: str = "~/.cache/vault_gen"):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Directory holding the cache database
+        """
+        path = Path(os.path.expanduser(cache_dir))
+        path.mkdir(parents=True, exist_ok=True)
+
+        self.conn = sqlite3.connect(str(path / "responses.sqlite3"), check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS notes ("
+            "template_id TEXT NOT NULL, topic TEXT NOT NULL, embedding BLOB NOT NULL, content TEXT NOT NULL, "
+            "PRIMARY KEY (template_id, topic))"
+        )
+        self.conn.commit()
+
+        # Normalized topic embeddings per template, loaded lazily from the notes table
+        self._note_index: Dict[str, Tuple[List[str], np.ndarray]] = {}
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> str:
+        """
+        Build the cache key for a chat request
+
+        Args:
+            model: Model name
+            messages: Chat messages (system and user prompts)
+            temperature: Sampling temperature
+            max_tokens: Completion token limit
+
+        Returns:
+            SHA-256 hex digest identifying the request
+        """
+        parts = [model] + [message["content"] for message in messages] + [str(temperature), str(max_tokens)]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None on a miss or a database error"""
+        try:
+            row = self.conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading response cache: {e}")
+            return None
+        return row[0] if row else None
+
+    def set(self, key: str, content: str):
+        """Store a response under a key; database errors are logged, not raised"""
+        try:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content) VALUES (?, ?)",
+                (key, content)
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing response cache: {e}")
+
+    def add_note(self, template_id: str, topic: str, embedding: np.ndarray, content: str):
+        """
+        Store a generated note for semantic lookups
+
+        Database errors are logged and the note is simply not stored.
+
+        Args:
+            template_id: Identifier of the prompt template the note was generated from
+            topic: Topic filled into the template
+            embedding: Embedding of the topic
+            content: Generated markdown
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        try:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO notes (template_id, topic, embedding, content) VALUES (?, ?, ?, ?)",
+                (template_id, topic, embedding.tobytes(), content)
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing note cache: {e}")
+            return
+        self._note_index.pop(template_id, None)
+
+    def nearest_note(
+        self,
+        template_id: str,
+        embedding: np.ndarray,
+        threshold: float
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Find the cached note whose topic is most similar to the given embedding
+
+        Args:
+            template_id: Only notes generated from this template are considered
+            embedding: Embedding of the new topic
+            threshold: Minimum cosine similarity for a match
+
+        Returns:
+            (topic, content) of the best match, or None if nothing is similar
+            enough or the database cannot be read
+        """
+        try:
+            return self._nearest_note(template_id, embedding, threshold)
+        except sqlite3.Error as e:
+            print(f"Error reading note cache: {e}")
+            return None
+
+    def _nearest_note(
+        self,
+        template_id: str,
+        embedding: np.ndarray,
+        threshold: float
+    ) -> Optional[Tuple[str, str]]:
+        """Implementation of nearest_note; database errors propagate"""
+        if template_id not in self._note_index:
+            rows = self.conn.execute(
+                "SELECT topic, embedding FROM notes WHERE template_id = ?", (template_id,)
+            ).fetchall()
+            if not rows:
+                return None
+            topics = [row[0] for row in rows]
+            matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            self._note_index[template_id] = (topics, matrix)
+
+        topics, matrix = self._note_index[template_id]
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < threshold:
+            return None
+
+        row = self.conn.execute(
+            "SELECT content FROM notes WHERE template_id = ? AND topic = ?", (template_id, topics[best])
+        ).fetchone()
+        return (topics[best], row[0]) if row else None
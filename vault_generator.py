@@ -4,6 +4,7 @@ to create interconnected Obsidian vaults
 """
 import os
 import json
+import asyncio
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime
@@ -11,15 +12,30 @@ from datetime import datetime
 from mcp_obsidian_client import ObsidianMCPClient
 from content_generator import ContentGenerator
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 
 class VaultGenerator:
     """Generate complete interconnected Obsidian vaults"""
     
+    # Characters that are not allowed in note filenames
+    _SANITIZE_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+    
     def __init__(
         self,
         vault_base_path: str,
         api_key: Optional[str] = None,
-        provider: str = "openai"
+        provider: str = "openai",
+        model: str = "gpt-4o-mini",
+        requests_per_minute: int = 500,
+        tokens_per_minute: int = 150_000,
+        cache_dir: Optional[str] = "~/.cache/vault_gen",
+        semantic_cache: bool = False,
+        rewrite_model: str = "gpt-4o-mini"
     ):
         """
         Initialize the vault generator
@@ -28,12 +44,30 @@ class VaultGenerator:
             vault_base_path: Base directory where vaults will be created
             api_key: LLM API key (optional, can use env var)
             provider: LLM provider name
+            model: Chat model used to generate topics and notes
+            requests_per_minute: Request rate limit of the LLM account
+            tokens_per_minute: Token rate limit of the LLM account
+            cache_dir: Directory for cached LLM responses (None disables caching)
+            semantic_cache: Adapt cached notes on similar topics instead of
+                generating every note from scratch
+            rewrite_model: Model used by the semantic cache to adapt notes; it
+                only pays off when cheaper than model (ignored if the same)
         """
         self.vault_base_path = Path(vault_base_path)
         self.vault_base_path.mkdir(parents=True, exist_ok=True)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._sanitized_names: Dict[str, str] = {}
         
         self.mcp_client = ObsidianMCPClient()
-        self.content_generator = ContentGenerator(api_key=api_key, provider=provider)
+        self.content_generator = ContentGenerator(
+            api_key=api_key,
+            provider=provider,
+            model=model,
+            cache_dir=cache_dir,
+            semantic_cache=semantic_cache,
+            rewrite_model=rewrite_model
+        )
     
     def create_interconnected_vault(
         self,
@@ -41,7 +75,9 @@ class VaultGenerator:
         main_topic: str,
         num_notes: int = 30,
         connection_density: float = 0.4,
-        use_ai: bool = True
+        use_ai: bool = True,
+        generation_mode: str = "concurrent",
+        seed: Optional[int] = None
     ) -> Path:
         """
         Create a complete interconnected vault
@@ -52,6 +88,12 @@ class VaultGenerator:
             num_notes: Number of notes to create
             connection_density: How interconnected (0.0 to 1.0)
             use_ai: Whether to use AI for content generation
+            generation_mode: "concurrent" to request all notes in parallel
+                (throttled to the account rate limits), "combined" to request
+                all notes in as few structured-output calls as possible, or
+                "batch" to use the OpenAI Batch API (half the cost, but may
+                take up to 24h to complete)
+            seed: Random seed for reproducible note connections
             
         Returns:
             Path to the created vault
@@ -67,32 +109,33 @@ class VaultGenerator:
         structure = self.content_generator.generate_vault_structure(
             main_topic,
             num_nodes=num_notes,
-            connection_density=connection_density
+            connection_density=connection_density,
+            seed=seed
         )
         
         # Create index/README note
         self._create_index_note(vault_path, main_topic, list(structure.keys()))
         
-        # Create all notes with their connections
-        created_notes = {}
-        for topic, metadata in structure.items():
-            print(f"  Creating note: {topic}")
-            content = self.content_generator.generate_note_content(
-                topic=topic,
-                related_topics=metadata["related"],
-                note_type=metadata["note_type"]
-            )
-            
-            # Clean topic name for filename
-            note_name = self._sanitize_filename(topic)
-            success = self.mcp_client.create_note(
-                str(vault_path),
-                note_name,
-                content
-            )
-            
-            if success:
-                created_notes[topic] = note_name
+        # Generate all note contents, then write them to disk
+        if generation_mode == "batch":
+            jobs = self._note_jobs(structure)
+            contents = dict(zip(structure.keys(), self.content_generator.generate_notes_batch(jobs)))
+        elif generation_mode == "combined":
+            contents = asyncio.run(self._acreate_all_notes_combined(structure))
+        else:
+            contents = asyncio.run(self._acreate_all_notes(structure))
+        
+        # Clean topic names for filenames and write all notes at once
+        note_names = {topic: self._sanitize_filename(topic) for topic in contents}
+        results = self.mcp_client.create_notes_bulk(
+            str(vault_path),
+            [(note_names[topic], content) for topic, content in contents.items()]
+        )
+        created_notes = {
+            topic: note_names[topic]
+            for topic, success in zip(contents, results)
+            if success
+        }
         
         # Create additional hub notes for better connectivity
         self._create_hub_notes(vault_path, structure, created_notes)
@@ -106,9 +149,55 @@ class VaultGenerator:
         
         return vault_path
     
+    def _note_jobs(self, structure: Dict[str, Dict]) -> List[Dict]:
+        """Convert a vault structure into note generation jobs"""
+        return [
+            {
+                "topic": topic,
+                "related_topics": metadata["related"],
+                "note_type": metadata["note_type"]
+            }
+            for topic, metadata in structure.items()
+        ]
+    
+    async def _acreate_all_notes(self, structure: Dict[str, Dict]) -> Dict[str, str]:
+        """
+        Generate content for every note in the structure concurrently
+        
+        Args:
+            structure: Vault structure from ContentGenerator.generate_vault_structure
+            
+        Returns:
+            Dictionary mapping topics to their markdown content
+        """
+        for topic in structure:
+            print(f"  Creating note: {topic}")
+        
+        # Share one connection pool across all requests and release it
+        # before asyncio.run closes the event loop
+        async with self.content_generator:
+            contents = await self.content_generator.generate_notes_parallel(
+                self._note_jobs(structure),
+                rpm=self.requests_per_minute,
+                tpm=self.tokens_per_minute
+            )
+        
+        return dict(zip(structure.keys(), contents))
+    
+    async def _acreate_all_notes_combined(self, structure: Dict[str, Dict]) -> Dict[str, str]:
+        """Generate content for every note with combined multi-note requests"""
+        print(f"  Creating {len(structure)} notes in combined requests")
+        
+        async with self.content_generator:
+            return await self.content_generator.generate_all_notes(
+                structure,
+                rpm=self.requests_per_minute,
+                tpm=self.tokens_per_minute
+            )
+    
     def _create_index_note(self, vault_path: Path, main_topic: str, all_topics: List[str]):
         """Create an index/README note with links to all other notes"""
-        index_content = f"""# {main_topic} - Knowledge Vault
+        parts = [f"""# {main_topic} - Knowledge Vault
 
 **Created:** {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
 
@@ -123,13 +212,13 @@ This vault contains interconnected knowledge about **{main_topic}**. Use the gra
 
 ### All Topics
 
-"""
+"""]
         # Group topics for better organization
         for topic in sorted(all_topics):
             note_name = self._sanitize_filename(topic)
-            index_content += f"- [[{note_name}]]\n"
+            parts.append(f"- [[{note_name}]]\n")
         
-        index_content += f"""
+        parts.append(f"""
 ## Graph View
 
 Open the graph view in Obsidian (Ctrl+G / Cmd+G) to visualize the connections between all notes.
@@ -146,7 +235,8 @@ Open the graph view in Obsidian (Ctrl+G / Cmd+G) to visualize the connections be
 2. Explore notes by clicking links
 3. Use graph view to see connections
 4. Add your own notes and connections
-"""
+""")
+        index_content = "".join(parts)
         
         self.mcp_client.create_note(str(vault_path), "README", index_content)
     
@@ -158,16 +248,17 @@ Open the graph view in Obsidian (Ctrl+G / Cmd+G) to visualize the connections be
         
         # Create a hub note for top connections
         if sorted_topics:
-            hub_content = """# Knowledge Hubs
+            parts = ["""# Knowledge Hubs
 
 These are the most interconnected nodes in the vault - excellent starting points for exploration.
 
 ## Central Hubs
 
-"""
+"""]
             for topic, count in sorted_topics[:10]:
                 note_name = created_notes.get(topic, self._sanitize_filename(topic))
-                hub_content += f"- [[{note_name}]] ({count} connections)\n"
+                parts.append(f"- [[{note_name}]] ({count} connections)\n")
+            hub_content = "".join(parts)
             
             self.mcp_client.create_note(str(vault_path), "Knowledge Hubs", hub_content)
     
@@ -187,9 +278,7 @@ These are the most interconnected nodes in the vault - excellent starting points
             "strictLineBreaks": False
         }
         
-        app_json = obsidian_dir / "app.json"
-        with open(app_json, "w") as f:
-            json.dump(app_config, f, indent=2)
+        self._write_json(obsidian_dir / "app.json", app_config)
         
         # Graph view configuration for better visualization
         graph_config = {
@@ -214,27 +303,27 @@ These are the most interconnected nodes in the vault - excellent starting points
             "scale": 1.0
         }
         
-        graph_json = obsidian_dir / "graph.json"
-        with open(graph_json, "w") as f:
-            json.dump(graph_config, f, indent=2)
+        self._write_json(obsidian_dir / "graph.json", graph_config)
         
         print("  ✓ Obsidian configuration created")
     
+    def _write_json(self, path: Path, data: Dict):
+        """Write indented JSON in one call, using orjson when installed"""
+        if ORJSON_AVAILABLE:
+            path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        else:
+            path.write_bytes(json.dumps(data, indent=2).encode("utf-8"))
+    
     def _sanitize_filename(self, name: str) -> str:
         """Sanitize a name for use as a filename"""
-        # Remove invalid characters
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            name = name.replace(char, '_')
-        
-        # Remove leading/trailing dots and spaces
-        name = name.strip('. ')
-        
-        # Limit length
-        if len(name) > 100:
-            name = name[:100]
+        sanitized = self._sanitized_names.get(name)
+        if sanitized is None:
+            # Replace invalid characters, remove leading/trailing dots and
+            # spaces, and limit length
+            sanitized = name.translate(self._SANITIZE_TABLE).strip('. ')[:100]
+            self._sanitized_names[name] = sanitized
         
-        return name
+        return sanitized
 
 
 def main():
@@ -246,8 +335,17 @@ def main():
     parser.add_argument("--topic", required=True, help="Main topic for the vault")
     parser.add_argument("--notes", type=int, default=30, help="Number of notes to create")
     parser.add_argument("--density", type=float, default=0.4, help="Connection density (0.0-1.0)")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible connections")
     parser.add_argument("--vault-path", default="~/Obsidian-Vaults", help="Base path for vaults")
     parser.add_argument("--api-key", help="LLM API key (or use OPENAI_API_KEY env var)")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Chat model used to generate content")
+    parser.add_argument("--mode", default="concurrent", choices=["concurrent", "combined", "batch"],
+                        help="Note generation mode (batch uses the OpenAI Batch API)")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the LLM instead of reusing cached responses")
+    parser.add_argument("--semantic-cache", action="store_true",
+                        help="Adapt cached notes on similar topics with a cheaper model")
+    parser.add_argument("--rewrite-model", default="gpt-4o-mini",
+                        help="Model used by --semantic-cache to adapt notes (must differ from --model)")
     
     args = parser.parse_args()
     
@@ -256,14 +354,20 @@ def main():
     
     generator = VaultGenerator(
         vault_base_path=vault_base,
-        api_key=args.api_key
+        api_key=args.api_key,
+        model=args.model,
+        cache_dir=None if args.no_cache else "~/.cache/vault_gen",
+        semantic_cache=args.semantic_cache,
+        rewrite_model=args.rewrite_model
     )
     
     vault_path = generator.create_interconnected_vault(
         vault_name=args.vault_name,
         main_topic=args.topic,
         num_notes=args.notes,
-        connection_density=args.density
+        connection_density=args.density,
+        generation_mode=args.mode,
+        seed=args.seed
     )
     
     print(f"\n🎉 Done! Open Obsidian and add this vault: {vault_path}")